@@ -1,52 +1,66 @@
 import argparse
+import contextlib
+import functools
 import json
 import logging
+import math
 import pathlib
 import os
+import shutil
+import sys
+import tempfile
 try:
     from importlib.metadata import version
 except ImportError:
     from importlib_metadata import version
 
-import yaml
-try:
-    from yaml import CLoader as Loader
-except ImportError:
-    from yaml import Loader
-
-
-from . import parser
-from . import generator
-
 MANIFEST_PATH = './manifest.json'
 DEFAULT_LOOKML_OUTPUT_DIR = './lookml'
+MODELS_PER_CHUNK = 16
+
+
+def load_json(f):
+    # orjson is an optional, much faster parser for large manifest/catalog files
+    try:
+        import orjson
+    except ImportError:
+        return json.loads(f.read())
+    return orjson.loads(f.read())
 
 
 def get_manifest(prefix: str):
+    from . import parser
     manifest_path = os.path.join(prefix, 'manifest.json')
     try:
-        with open(manifest_path, 'r') as f:
-            raw_manifest = json.load(f)
+        with open(manifest_path, 'rb') as f:
+            manifest = parser.stream_manifest(f) if parser.ijson else parser.parse_manifest(load_json(f))
     except FileNotFoundError as e:
         logging.error(f'Could not find manifest file at {manifest_path}. Use --target-dir to change the search path for the manifest.json file.')
         raise SystemExit('Failed')
     logging.debug(f'Detected manifest at {manifest_path}')
-    return raw_manifest
+    return manifest
 
 
 def get_catalog(prefix: str):
+    from . import parser
     catalog_path = os.path.join(prefix, 'catalog.json')
     try:
-        with open(catalog_path, 'r') as f:
-            raw_catalog = json.load(f)
+        with open(catalog_path, 'rb') as f:
+            catalog = parser.stream_catalog(f) if parser.ijson else parser.parse_catalog(load_json(f))
     except FileNotFoundError as e:
         logging.error(f'Could not find catalog file at {catalog_path}. Use --target-dir to change the search path for the catalog.json file.')
         raise SystemExit('Failed')
     logging.debug(f'Detected catalog at {catalog_path}')
-    return raw_catalog
+    return catalog
 
 
 def get_dbt_project_config(prefix: str):
+    import yaml
+    try:
+        from yaml import CSafeLoader as Loader
+    except ImportError:
+        from yaml import SafeLoader as Loader  # type: ignore[assignment]
+
     project_path  = os.path.join(prefix, 'dbt_project.yml')
     try:
         with open(project_path, 'r') as f:
@@ -58,6 +72,77 @@ def get_dbt_project_config(prefix: str):
     return project_config
 
 
+def configure_logging(log_level: str):
+    logging.basicConfig(
+        level=getattr(logging, log_level),
+        format='%(asctime)s %(levelname)-6s %(message)s',
+        datefmt='%H:%M:%S',
+    )
+
+
+@contextlib.contextmanager
+def model_mapper(jobs: int, log_level: str):
+    # Yields a map function over dbt models, backed by worker processes when more than one job is used
+    if jobs > 1:
+        import concurrent.futures
+        try:
+            executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=jobs,
+                initializer=configure_logging,
+                initargs=(log_level,),
+            )
+        except (OSError, NotImplementedError) as e:
+            # e.g. no /dev/shm for multiprocessing locks in some sandboxes
+            logging.warning(f'Could not start worker processes, generating lookml in a single process: {e}')
+        else:
+            with executor:
+                try:
+                    yield functools.partial(executor.map, chunksize=MODELS_PER_CHUNK)
+                except BaseException:
+                    # Drop queued chunks on failure rather than waiting for them to run at shutdown
+                    if sys.version_info >= (3, 9):
+                        executor.shutdown(cancel_futures=True)
+                    raise
+            return
+    yield map
+
+
+def available_cpu_count() -> int:
+    # Only count the cpus this process may run on, e.g. when pinned by taskset or a container
+    if hasattr(os, 'process_cpu_count'):
+        return os.process_cpu_count() or 1
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+@contextlib.contextmanager
+def staged_output_dir(output_dir: str):
+    # Yields a staging directory whose files are moved into output_dir only once every file has been generated,
+    # so a model that fails to generate leaves any existing lookml untouched
+    created = not os.path.isdir(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(prefix='.dbt2looker-', dir=output_dir)
+    try:
+        yield staging_dir
+    except BaseException:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        if created:
+            shutil.rmtree(output_dir, ignore_errors=True)
+        raise
+    for directory, _, filenames in os.walk(staging_dir):
+        target_dir = os.path.normpath(os.path.join(output_dir, os.path.relpath(directory, staging_dir)))
+        os.makedirs(target_dir, exist_ok=True)
+        for filename in filenames:
+            os.replace(os.path.join(directory, filename), os.path.join(target_dir, filename))
+    shutil.rmtree(staging_dir)
+
+
+def create_output_directories(output_dir: str, directories):
+    for directory in set(directories):
+        os.makedirs(os.path.join(output_dir, directory), exist_ok=True)
+
+
 def run():
     argparser = argparse.ArgumentParser()
     argparser.add_argument(
@@ -110,49 +195,75 @@ def run():
         help='DB Connection Name for generated model files',
         type=str,
     )
-    args = argparser.parse_args()
-    logging.basicConfig(
-        level=getattr(logging, args.log_level),
-        format='%(asctime)s %(levelname)-6s %(message)s',
-        datefmt='%H:%M:%S',
+    argparser.add_argument(
+        '--jobs',
+        help='Number of processes used to generate lookml files. Default is one per CPU, fewer for small projects',
+        type=int,
     )
+    args = argparser.parse_args()
+    if args.jobs is not None and args.jobs < 1:
+        argparser.error('--jobs must be at least 1')
+    configure_logging(args.log_level)
 
-    # Load raw manifest file
-    raw_manifest = get_manifest(prefix=args.target_dir)
-    raw_catalog = get_catalog(prefix=args.target_dir)
+    # Imported after argument parsing so --help and --version skip loading pydantic and lkml
+    from . import parser
+    from . import generator
+
+    # Load and validate manifest and catalog files
+    manifest = get_manifest(prefix=args.target_dir)
+    catalog = get_catalog(prefix=args.target_dir)
     raw_config = get_dbt_project_config(prefix=args.project_dir)
 
     # Get dbt models from manifest
     dbt_project_config = parser.parse_dbt_project_config(raw_config)
-    typed_dbt_models = parser.parse_typed_models(raw_manifest, raw_catalog, tag=args.tag)
-    adapter_type = parser.parse_adapter_type(raw_manifest)
-
-    # Generate lookml views
-    lookml_views = [
-        generator.lookml_view_from_dbt_model(model, adapter_type, args.use_file_path)
-        for model in typed_dbt_models
-    ]
-    for view in lookml_views:
-        path = os.path.join(args.output_dir, 'views', view.directory, view.filename)
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, 'w') as f:
-            f.write(view.contents)
+    typed_dbt_models = parser.parse_typed_models(manifest, catalog, tag=args.tag)
+    adapter_type = parser.parse_adapter_type(manifest)
+    # Only the typed models are used from here on, so release every other manifest and catalog node
+    del manifest, catalog
 
-    logging.info(f'Generated {len(lookml_views)} lookml views in {os.path.join(args.output_dir, "views")}')
+    # Models are independent, so generate and write lookml files in worker processes to use all cores
+    # Workers stream their files straight to disk, so generated lookml is never collected in this process
+    # Small projects are generated in this process, since starting workers would cost more than it saves
+    jobs = args.jobs or min(available_cpu_count(), math.ceil(len(typed_dbt_models) / MODELS_PER_CHUNK))
+    # Files are staged and only moved into the output directory once every view and explore has been generated
+    with staged_output_dir(args.output_dir) as staging_dir, model_mapper(jobs, args.log_level) as map_models:
+        # Generate lookml views
+        views_dir = os.path.join(staging_dir, 'views')
+        create_output_directories(
+            views_dir,
+            (generator.lookml_file_directory(model, args.use_file_path) for model in typed_dbt_models),
+        )
+        lookml_views = list(map_models(
+            functools.partial(
+                generator.write_lookml_view_from_dbt_model,
+                adapter_type=adapter_type,
+                use_file_path=args.use_file_path,
+                output_dir=views_dir,
+            ),
+            typed_dbt_models,
+        ))
 
-    # Generate Lookml models
-    connection_name = args.model_connection or dbt_project_config.name
-    lookml_models = [
-        generator.lookml_model_from_dbt_model(model, connection_name, args.use_file_path)
-        for model in typed_dbt_models
-        if args.explore_tag in model.tags
-    ]
-    for model in lookml_models:
-        path = os.path.join(args.output_dir, model.directory, model.filename)
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, 'w') as f:
-            f.write(model.contents)
-    
+        # Generate Lookml models, explores are only generated for models with the explore tag
+        if args.explore_tag is None:
+            explore_models = []
+        else:
+            explore_models = [model for model in typed_dbt_models if args.explore_tag in model.tags]
+        connection_name = args.model_connection or dbt_project_config.name
+        create_output_directories(
+            staging_dir,
+            (generator.lookml_file_directory(model, args.use_file_path) for model in explore_models),
+        )
+        lookml_models = list(map_models(
+            functools.partial(
+                generator.write_lookml_model_from_dbt_model,
+                connection_name=connection_name,
+                use_file_path=args.use_file_path,
+                output_dir=staging_dir,
+            ),
+            explore_models,
+        ))
+
+    logging.info(f'Generated {len(lookml_views)} lookml views in {os.path.join(args.output_dir, "views")}')
     logging.info(f'Generated {len(lookml_models)} lookml models in {args.output_dir}')
     logging.info('Success')
 
@@ -1,6 +1,8 @@
+import functools
 import logging
 import os
 import re
+from typing import IO, Dict, List, Optional, Tuple
 
 import lkml
 
@@ -177,9 +179,17 @@ LOOKER_DTYPE_MAP = {
     }
 }
 
-looker_date_time_types = ['datetime', 'timestamp']
-looker_date_types = ['date']
-looker_scalar_types = ['number', 'yesno', 'string']
+looker_date_time_types = frozenset(['datetime', 'timestamp'])
+looker_date_types = frozenset(['date'])
+looker_scalar_types = frozenset(['number', 'yesno', 'string'])
+
+SPARK_TYPE_RE = re.compile(r'^[^\(]*')
+
+# Field keys whose values lkml would quote when dumping a view
+lookml_quoted_keys = frozenset(['description', 'label', 'group_label'])
+
+# A column alongside its looker type, dimension name and default sql
+ColumnField = Tuple[models.DbtModelColumn, str, str, str]
 
 looker_timeframes = [
     'raw',
@@ -193,126 +203,161 @@ looker_timeframes = [
 
 
 def normalise_spark_types(column_type: str) -> str:
-    return re.match(r'^[^\(]*', column_type).group(0)
+    return SPARK_TYPE_RE.match(column_type).group(0)
+
 
+@functools.lru_cache(maxsize=None)
+def default_column_sql(column_name: str) -> str:
+    # Column names repeat across models, so share one sql string per name
+    return f'${{TABLE}}.{column_name}'
 
+
+@functools.lru_cache(maxsize=None)
 def map_adapter_type_to_looker(adapter_type: models.SupportedDbtAdapters, column_type: str):
     if not column_type:
         return None
     normalised_column_type = (normalise_spark_types(column_type) if adapter_type == models.SupportedDbtAdapters.spark.value else column_type).upper()
-    looker_type = LOOKER_DTYPE_MAP[adapter_type].get(normalised_column_type)
-    if (column_type is not None) and (looker_type is None):
-        logging.warning(f'Column type {column_type} not supported for conversion from {adapter_type} to looker. No dimension will be created.')
-    return looker_type
+    return LOOKER_DTYPE_MAP[adapter_type].get(normalised_column_type)
 
 
-def lookml_date_time_dimension_group(column: models.DbtModelColumn, adapter_type: models.SupportedDbtAdapters):
-    datatype = map_adapter_type_to_looker(adapter_type, column.data_type)
+def lookml_date_time_dimension_group(
+    column: models.DbtModelColumn,
+    adapter_type: models.SupportedDbtAdapters,
+    looker_type: str,
+    dimension_name: str,
+    default_sql: str,
+):
     if adapter_type == models.SupportedDbtAdapters.snowflake.value and column.data_type in ("TIMESTAMP_LTZ", "TIMESTAMP_TZ"):
         logging.debug(f"Snowflake TIMESTAMP_LTZ and TIMESTAMP_TZ are not supported by Looker. Casting to TIMESTAMP_NTZ")
-        default_sql = f'${{TABLE}}.{column.name}::TIMESTAMP_NTZ'
-    else:
-        default_sql = f'${{TABLE}}.{column.name}'
+        default_sql = f'{default_sql}::TIMESTAMP_NTZ'
     return {
-        'name': column.meta.dimension.name or column.name,
+        'name': dimension_name,
         'type': 'time',
         'sql': column.meta.dimension.sql or default_sql,
         'description': column.meta.dimension.description or column.description,
-        'datatype': datatype,
+        'datatype': looker_type,
         'timeframes': ['raw', 'time', 'hour', 'date', 'week', 'month', 'quarter', 'year']
     }
 
 
-def lookml_date_dimension_group(column: models.DbtModelColumn, adapter_type: models.SupportedDbtAdapters):
+def lookml_date_dimension_group(column: models.DbtModelColumn, looker_type: str, dimension_name: str, default_sql: str):
     return {
-        'name': column.meta.dimension.name or column.name,
+        'name': dimension_name,
         'type': 'time',
-        'sql': column.meta.dimension.sql or f'${{TABLE}}.{column.name}',
+        'sql': column.meta.dimension.sql or default_sql,
         'description': column.meta.dimension.description or column.description,
-        'datatype': map_adapter_type_to_looker(adapter_type, column.data_type),
+        'datatype': looker_type,
         'timeframes': ['raw', 'date', 'week', 'month', 'quarter', 'year']
     }
 
 
-def lookml_dimension_groups_from_model(model: models.DbtModel, adapter_type: models.SupportedDbtAdapters):
-    date_times = [
-        lookml_date_time_dimension_group(column, adapter_type)
-        for column in model.columns.values()
-        if map_adapter_type_to_looker(adapter_type, column.data_type) in looker_date_time_types
-    ]
-    dates = [
-        lookml_date_dimension_group(column, adapter_type)
-        for column in model.columns.values()
-        if column.meta.dimension.enabled
-        and map_adapter_type_to_looker(adapter_type, column.data_type) in looker_date_types
-    ]
-    return date_times + dates
-
-
-def lookml_dimensions_from_model(model: models.DbtModel, adapter_type: models.SupportedDbtAdapters):
-    dimensions = []
-    for column in model.columns.values():
+def bucket_columns(model: models.DbtModel, adapter_type: models.SupportedDbtAdapters):
+    # Sort columns by the lookml fields they generate in a single pass, resolving each looker type once
+    date_times: List[ColumnField] = []
+    dates: List[ColumnField] = []
+    scalars: List[ColumnField] = []
+    measure_columns: List[models.DbtModelColumn] = []
+    dimension_names: Dict[str, str] = {}
+    for column_name, column in model.columns.items():
+        looker_type = map_adapter_type_to_looker(adapter_type, column.data_type)
+        if column.data_type and looker_type is None:
+            logging.warning(
+                f'Column {column.name} in model {model.name} has type {column.data_type}, which is not supported '
+                f'for conversion from {adapter_type} to looker. No dimension will be created.'
+            )
+        dimension_name = dimension_names[column_name] = column.meta.dimension.name or column.name
+        field = (column, looker_type, dimension_name, default_column_sql(column.name))
+        if looker_type in looker_date_time_types:
+            date_times.append(field)
         if not column.meta.dimension.enabled:
             logging.debug(f'Dimension {column.name} is disabled in model {model.name}')
-            continue
-        if map_adapter_type_to_looker(adapter_type, column.data_type) not in looker_scalar_types:
+        elif looker_type in looker_scalar_types:
+            scalars.append(field)
+        else:
             logging.debug(f'Column {column.name} is not a scalar type, no dimension will be created.')
-            continue
-        lookml_dict = {
-            'name': column.meta.dimension.name or column.name,
-            'type': map_adapter_type_to_looker(adapter_type, column.data_type),
-            'sql': column.meta.dimension.sql or f'${{TABLE}}.{column.name}',
-            'description': column.meta.dimension.description or column.description,
-        }
-        if (column.meta.dimension.value_format_name
-                and map_adapter_type_to_looker(adapter_type, column.data_type) == 'number'):
-            lookml_dict['value_format_name'] =  column.meta.dimension.value_format_name.value
-        if column.constraints and "primary_key" in [constraint.type for constraint in column.constraints]:
-            lookml_dict['primary_key'] = "yes"
-        if column.meta.dimension.hidden:
-            lookml_dict['hidden'] = 'yes'
-        dimensions.append(lookml_dict)
+            if looker_type in looker_date_types:
+                dates.append(field)
+        if column.meta.measures or column.meta.measure or column.meta.metrics or column.meta.metric:
+            measure_columns.append(column)
+    return date_times, dates, scalars, measure_columns, dimension_names
+
+
+def lookml_dimension_groups(date_times: List[ColumnField], dates: List[ColumnField], adapter_type: models.SupportedDbtAdapters):
+    return [
+        lookml_date_time_dimension_group(column, adapter_type, looker_type, dimension_name, default_sql)
+        for column, looker_type, dimension_name, default_sql in date_times
+    ] + [
+        lookml_date_dimension_group(column, looker_type, dimension_name, default_sql)
+        for column, looker_type, dimension_name, default_sql in dates
+    ]
 
-    return dimensions
+
+def lookml_dimension(column: models.DbtModelColumn, looker_type: str, dimension_name: str, default_sql: str):
+    lookml_dict = {
+        'name': dimension_name,
+        'type': looker_type,
+        'sql': column.meta.dimension.sql or default_sql,
+        'description': column.meta.dimension.description or column.description,
+    }
+    if column.meta.dimension.value_format_name and looker_type == 'number':
+        lookml_dict['value_format_name'] =  column.meta.dimension.value_format_name.value
+    if column.constraints and "primary_key" in [constraint.type for constraint in column.constraints]:
+        lookml_dict['primary_key'] = "yes"
+    if column.meta.dimension.hidden:
+        lookml_dict['hidden'] = 'yes'
+    return lookml_dict
 
 
-def lookml_measure_filters(measure: models.Dbt2LookerMeasure, model: models.DbtModel):
+def lookml_measure_filters(measure: models.Dbt2LookerMeasure, model: models.DbtModel, dimension_names: Dict[str, str]):
     try:
-        columns = {
-            column_name: model.columns[column_name]
-            for f in measure.filters
-            for column_name in f
-        }
+        return [{
+            dimension_names[column_name]: fexpr
+            for column_name, fexpr in f.items()
+        } for f in measure.filters]
     except KeyError as e:
         raise ValueError(
             f'Model {model.unique_id} contains a measure that references a non_existent column: {e}\n'
             f'Ensure that dbt model {model.unique_id} contains a column: {e}'
         ) from e
-    return [{
-        (columns[column_name].meta.dimension.name or column_name): fexpr
-        for column_name, fexpr in f.items()
-    } for f in measure.filters]
 
 
-def lookml_measures_from_model(model: models.DbtModel):
-    return [
-        lookml_measure(measure_name, column, measure, model)
-        for column in model.columns.values()
-        for measure_name, measure in {
-            **column.meta.measures, **column.meta.measure, **column.meta.metrics, **column.meta.metric
-        }.items()
-    ]
+def lookml_measures(measure_columns: List[models.DbtModelColumn], model: models.DbtModel, dimension_names: Dict[str, str]):
+    for column in measure_columns:
+        default_sql = default_column_sql(column.name)
+        measure_dicts = [
+            measures
+            for measures in (column.meta.measures, column.meta.measure, column.meta.metrics, column.meta.metric)
+            if measures
+        ]
+        # Only merge when several aliases are used, a measure name repeated across them keeps its last definition
+        if len(measure_dicts) == 1:
+            column_measures = measure_dicts[0]
+        else:
+            column_measures = {
+                measure_name: measure
+                for measures in measure_dicts
+                for measure_name, measure in measures.items()
+            }
+        for measure_name, measure in column_measures.items():
+            yield lookml_measure(measure_name, column, default_sql, measure, model, dimension_names)
 
 
-def lookml_measure(measure_name: str, column: models.DbtModelColumn, measure: models.Dbt2LookerMeasure, model: models.DbtModel):
+def lookml_measure(
+    measure_name: str,
+    column: models.DbtModelColumn,
+    default_sql: str,
+    measure: models.Dbt2LookerMeasure,
+    model: models.DbtModel,
+    dimension_names: Dict[str, str],
+):
     m = {
         'name': measure_name,
         'type': measure.type.value,
-        'sql': measure.sql or f'${{TABLE}}.{column.name}',
+        'sql': measure.sql or default_sql,
         'description': measure.description or column.description or f'{measure.type.value.capitalize()} of {column.name}',
     }
     if measure.filters:
-        m['filters'] = lookml_measure_filters(measure, model)
+        m['filters'] = lookml_measure_filters(measure, model, dimension_names)
     if measure.value_format_name:
         m['value_format_name'] = measure.value_format_name.value
     if measure.group_label:
@@ -326,14 +371,77 @@ def lookml_measure(measure_name: str, column: models.DbtModelColumn, measure: mo
     return m
 
 
-def lookml_view_from_dbt_model(model: models.DbtModel, adapter_type: models.SupportedDbtAdapters, use_file_path: bool):
+def quote_lookml_value(value: str) -> str:
+    return '"' + value.replace('\\"', '"').replace('"', '\\"') + '"'
+
+
+def dump_lookml_field_value(key: str, value) -> str:
+    if key == 'filters':
+        filters = ''.join(
+            f'\n      {name}: {quote_lookml_value(fexpr)},'
+            for f in value
+            for name, fexpr in f.items()
+        )
+        return f'\n    {key}: [{filters}\n    ]'
+    if isinstance(value, list):
+        if len(value) >= 5:
+            items = ''.join(f'\n      {item},' for item in value)
+            return f'\n    {key}: [{items}\n    ]'
+        return f'\n    {key}: [{", ".join(value)}]'
+    if key == 'sql':
+        return f'\n    {key}: {value.strip()} ;;'
+    if key in lookml_quoted_keys:
+        return f'\n    {key}: {quote_lookml_value(value)}'
+    return f'\n    {key}: {value}'
+
+
+def iter_lookml_view(lookml: dict):
+    # Views have a fixed shape, so emit them directly with the same formatting as lkml.dump
+    view = lookml['view']
+    yield f'view: {view["name"]} {{'
+    yield f'\n  sql_table_name: {view["sql_table_name"].strip()} ;;'
+    for field_type, fields in (
+        ('dimension_group', view['dimension_groups']),
+        ('dimension', view['dimensions']),
+        ('measure', view['measures']),
+    ):
+        for field in fields:
+            yield f'\n\n  {field_type}: {field["name"]} {{'
+            for key, value in field.items():
+                if key != 'name':
+                    yield dump_lookml_field_value(key, value)
+            yield '\n  }'
+    yield '\n}'
+
+
+def dump_lookml_view(lookml: dict, file_object: Optional[IO] = None) -> Optional[str]:
+    if file_object:
+        file_object.writelines(iter_lookml_view(lookml))
+        return None
+    return ''.join(iter_lookml_view(lookml))
+
+
+def lookml_file_directory(model: models.DbtModel, use_file_path: bool) -> str:
+    return os.path.dirname(model.path) if use_file_path else ''
+
+
+def lookml_view_filename(model: models.DbtModel) -> str:
+    return f'{model.name}.view.lkml'
+
+
+def lookml_model_filename(model: models.DbtModel) -> str:
+    return f'{model.name}.model.lkml'
+
+
+def lookml_view(model: models.DbtModel, adapter_type: models.SupportedDbtAdapters):
+    date_times, dates, scalars, measure_columns, dimension_names = bucket_columns(model, adapter_type)
     lookml = {
         'view': {
             'name': model.name,
             'sql_table_name': model.relation_name,
-            'dimension_groups': lookml_dimension_groups_from_model(model, adapter_type),
-            'dimensions': lookml_dimensions_from_model(model, adapter_type),
-            'measures': lookml_measures_from_model(model),
+            'dimension_groups': lookml_dimension_groups(date_times, dates, adapter_type),
+            'dimensions': [lookml_dimension(*field) for field in scalars],
+            'measures': list(lookml_measures(measure_columns, model, dimension_names)),
         }
     }
     logging.debug(
@@ -342,17 +450,35 @@ def lookml_view_from_dbt_model(model: models.DbtModel, adapter_type: models.Supp
         len(lookml['view']['measures']),
         len(lookml['view']['dimensions']),
     )
-    contents = lkml.dump(lookml)
-    filename = f'{model.name}.view.lkml'
-    return models.LookViewFile(filename=filename,
-                               directory=os.path.dirname(model.path) if use_file_path else '',
+    return lookml
+
+
+def lookml_view_from_dbt_model(model: models.DbtModel, adapter_type: models.SupportedDbtAdapters, use_file_path: bool):
+    contents = ''.join(iter_lookml_view(lookml_view(model, adapter_type)))
+    return models.LookViewFile(filename=lookml_view_filename(model),
+                               directory=lookml_file_directory(model, use_file_path),
                                contents=contents)
 
 
-def lookml_model_from_dbt_model(model: models.DbtModel, connection_name: str, use_file_path: bool):
+def write_lookml_view_from_dbt_model(
+    model: models.DbtModel,
+    adapter_type: models.SupportedDbtAdapters,
+    use_file_path: bool,
+    output_dir: str,
+) -> str:
+    # Streams the view straight to disk, the output directory must already exist
+    # The view is built before opening the file, so a generation error leaves any existing file untouched
+    lookml = lookml_view(model, adapter_type)
+    path = os.path.join(output_dir, lookml_file_directory(model, use_file_path), lookml_view_filename(model))
+    with open(path, 'w') as f:
+        dump_lookml_view(lookml, f)
+    return path
+
+
+def lookml_model(model: models.DbtModel, connection_name: str):
     # Note: assumes view names = model names
     #       and models are unique across dbt packages in project
-    lookml = {
+    return {
         'connection': connection_name,
         'include': '/views/*',
         'explore': {
@@ -370,10 +496,21 @@ def lookml_model_from_dbt_model(model: models.DbtModel, connection_name: str, us
             ]
         }
     }
-    contents = lkml.dump(lookml)
-    filename = f'{model.name}.model.lkml'
+
+
+def lookml_model_from_dbt_model(model: models.DbtModel, connection_name: str, use_file_path: bool):
+    contents = lkml.dump(lookml_model(model, connection_name))
     return models.LookModelFile(
-        filename=filename,
-        directory=os.path.dirname(model.path) if use_file_path else '',
+        filename=lookml_model_filename(model),
+        directory=lookml_file_directory(model, use_file_path),
         contents=contents,
     )
+
+
+def write_lookml_model_from_dbt_model(model: models.DbtModel, connection_name: str, use_file_path: bool, output_dir: str) -> str:
+    # Writes the explore straight to disk, the output directory must already exist
+    lookml = lookml_model(model, connection_name)
+    path = os.path.join(output_dir, lookml_file_directory(model, use_file_path), lookml_model_filename(model))
+    with open(path, 'w') as f:
+        lkml.dump(lookml, f)
+    return path
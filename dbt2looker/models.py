@@ -1,6 +1,6 @@
 from enum import Enum
 from pathlib import Path
-from typing import Any, Union, Dict, List, Optional
+from typing import Any, Union, Dict, FrozenSet, List, Optional
 try:
     from typing import Literal
 except ImportError:
@@ -185,7 +185,7 @@ class DbtModel(DbtNode):
     name: str
     description: str
     columns: Dict[str, DbtModelColumn]
-    tags: List[str]
+    tags: FrozenSet[str]
     meta: DbtModelMeta
     path: Path
 
@@ -1,6 +1,11 @@
 import logging
 from typing import Dict, Optional, List
-from functools import reduce
+
+from pydantic import ValidationError
+try:
+    import ijson  # type: ignore[import-untyped]
+except ImportError:
+    ijson = None
 
 from . import models
 
@@ -9,43 +14,67 @@ def parse_dbt_project_config(raw_config: dict):
     return models.DbtProjectConfig(**raw_config)
 
 
-def parse_catalog_nodes(raw_catalog: dict):
-    catalog = models.DbtCatalog(**raw_catalog)
+def parse_manifest(raw_manifest: dict) -> models.DbtManifest:
+    return models.DbtManifest(**raw_manifest)
+
+
+def parse_catalog(raw_catalog: dict) -> models.DbtCatalog:
+    return models.DbtCatalog(**raw_catalog)
+
+
+def parse_manifest_node(raw_node: dict) -> models.DbtNode:
+    # Matches the manifest's Union[DbtModel, DbtNode], so empty model files still reach the check in parse_models
+    try:
+        return models.DbtModel.parse_obj(raw_node)
+    except ValidationError:
+        return models.DbtNode.parse_obj(raw_node)
+
+
+def stream_manifest(f) -> models.DbtManifest:
+    # Only the metadata and materialized models are used, so skip the macros, docs, sources etc. that make up
+    # most of a large manifest, and validate each model as it streams so its raw dict is dropped straight away
+    metadata = models.DbtManifestMetadata.parse_obj(next(ijson.items(f, 'metadata'), {}))
+    f.seek(0)
+    nodes = {
+        unique_id: parse_manifest_node(node)
+        for unique_id, node in ijson.kvitems(f, 'nodes')
+        if node.get('resource_type') == 'model'
+        and node.get('config', {}).get('materialized') != 'ephemeral'
+    }
+    return models.DbtManifest.construct(nodes=nodes, metadata=metadata)
+
+
+def stream_catalog(f) -> models.DbtCatalog:
+    return models.DbtCatalog.construct(nodes={
+        unique_id: models.DbtCatalogNode.parse_obj(node)
+        for unique_id, node in ijson.kvitems(f, 'nodes')
+    })
+
+
+def parse_catalog_nodes(catalog: models.DbtCatalog):
     return catalog.nodes
 
 
-def parse_adapter_type(raw_manifest: dict):
-    manifest = models.DbtManifest(**raw_manifest)
+def parse_adapter_type(manifest: models.DbtManifest):
     return manifest.metadata.adapter_type
 
 
 def tags_match(query_tag: str, model: models.DbtModel) -> bool:
-    try:
-        return query_tag in model.tags
-    except AttributeError:
-        return False
-    except ValueError:
-        # Is the tag just a string?
-        return query_tag == model.tags
-
-
-def parse_models(raw_manifest: dict, tag=None) -> List[models.DbtModel]:
-    manifest = models.DbtManifest(**raw_manifest)
-    materialized_models: List[models.DbtModel] = [
-        node
-        for node in manifest.nodes.values()
-        if node.resource_type == 'model' and node.config['materialized'] != 'ephemeral'
-    ]
-
-    # Empty model files have many missing parameters
-    for model in materialized_models:
-        if not hasattr(model, 'name'):
-            logging.error('Cannot parse model with id: "%s" - is the model file empty?', model.unique_id)
-            raise SystemExit('Failed')
+    return query_tag in model.tags
 
-    if tag is None:
-        return materialized_models
-    return [model for model in materialized_models if tags_match(tag, model)]
+
+def parse_models(manifest: models.DbtManifest, tag=None) -> List[models.DbtModel]:
+    materialized_models: List[models.DbtModel] = []
+    for node in manifest.nodes.values():
+        if node.resource_type != 'model' or node.config['materialized'] == 'ephemeral':
+            continue
+        # Empty model files have many missing parameters, so only parse as a DbtNode
+        if not isinstance(node, models.DbtModel):
+            logging.error('Cannot parse model with id: "%s" - is the model file empty?', node.unique_id)
+            raise SystemExit('Failed')
+        if tag is None or tags_match(tag, node):
+            materialized_models.append(node)
+    return materialized_models
 
 
 def check_models_for_missing_column_types(dbt_typed_models: List[models.DbtModel]):
@@ -54,19 +83,25 @@ def check_models_for_missing_column_types(dbt_typed_models: List[models.DbtModel
             logging.debug('Model %s has no typed columns, no dimensions will be generated. %s', model.unique_id, model)
 
 
-def parse_typed_models(raw_manifest: dict, raw_catalog: dict, tag: Optional[str] = None):
-    catalog_nodes = parse_catalog_nodes(raw_catalog)
-    dbt_models = parse_models(raw_manifest, tag=tag)
-    adapter_type = parse_adapter_type(raw_manifest)
+def parse_typed_models(manifest: models.DbtManifest, catalog: models.DbtCatalog, tag: Optional[str] = None):
+    catalog_nodes = parse_catalog_nodes(catalog)
+    dbt_models = parse_models(manifest, tag=tag)
+    adapter_type = parse_adapter_type(manifest)
 
     logging.debug('Parsed %d models from manifest.json', len(dbt_models))
-    for model in dbt_models:
-        logging.debug(
-            'Model %s has %d columns with %d measures',
-            model.name,
-            len(model.columns),
-            reduce(lambda acc, col: acc + len(col.meta.measures) + len(col.meta.measure) + len(col.meta.metrics) + len(col.meta.metric), model.columns.values(), 0)
-        )
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        for model in dbt_models:
+            logging.debug(
+                'Model %s has %d columns with %d measures',
+                model.name,
+                len(model.columns),
+                sum(
+                    len(measures)
+                    for col in model.columns.values()
+                    for measures in (col.meta.measures, col.meta.measure, col.meta.metrics, col.meta.metric)
+                    if measures
+                ),
+            )
 
     # Check catalog for models
     for model in dbt_models:
@@ -76,16 +111,11 @@ def parse_typed_models(raw_manifest: dict, raw_catalog: dict, tag: Optional[str]
                 f'Check if model has materialized in {adapter_type} at {model.relation_name}')
 
     # Update dbt models with data types from catalog
-    dbt_typed_models = [
-        model.copy(update={'columns': {
-            column.name: column.copy(update={
-                'data_type': get_column_type_from_catalog(catalog_nodes, model.unique_id, column.name)
-            })
-            for column in model.columns.values()
-        }})
-        for model in dbt_models
-        if model.unique_id in catalog_nodes
-    ]
+    # Models are freshly parsed from the manifest, so columns are updated in place rather than copied
+    dbt_typed_models = [model for model in dbt_models if model.unique_id in catalog_nodes]
+    for model in dbt_typed_models:
+        for column in model.columns.values():
+            column.data_type = get_column_type_from_catalog(catalog_nodes, model.unique_id, column.name)
     logging.debug('Found catalog entries for %d models', len(dbt_typed_models))
     logging.debug('Catalog entries missing for %d models', len(dbt_models) - len(dbt_typed_models))
     check_models_for_missing_column_types(dbt_typed_models)
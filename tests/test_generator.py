@@ -0,0 +1,104 @@
+import io
+import unittest
+
+import lkml
+
+from dbt2looker import generator, models
+
+
+def view(dimension_groups=None, dimensions=None, measures=None):
+    return {
+        'view': {
+            'name': 'orders',
+            'sql_table_name': 'analytics.orders',
+            'dimension_groups': dimension_groups or [],
+            'dimensions': dimensions or [],
+            'measures': measures or [],
+        }
+    }
+
+
+class DumpLookmlViewTest(unittest.TestCase):
+
+    def assertDumpsLikeLkml(self, lookml: dict):
+        self.assertEqual(generator.dump_lookml_view(lookml), lkml.dump(lookml))
+
+    def test_empty_field_buckets(self):
+        self.assertDumpsLikeLkml(view())
+
+    def test_quoted_and_escaped_values(self):
+        self.assertDumpsLikeLkml(view(
+            dimensions=[{
+                'name': 'status',
+                'type': 'string',
+                'sql': '${TABLE}.status',
+                'description': 'The "current" status, see \\"docs\\"',
+            }],
+            measures=[{
+                'name': 'total',
+                'type': 'sum',
+                'sql': '${TABLE}.amount',
+                'description': '',
+                'label': 'Total "net"',
+                'group_label': 'Money',
+            }],
+        ))
+
+    def test_sql_with_surrounding_whitespace(self):
+        self.assertDumpsLikeLkml(view(dimensions=[{
+            'name': 'is_paid',
+            'type': 'yesno',
+            'sql': '\n  ${TABLE}.paid_at is not null  \n',
+            'description': 'Paid',
+            'primary_key': 'yes',
+            'hidden': 'yes',
+        }]))
+
+    def test_filters(self):
+        self.assertDumpsLikeLkml(view(measures=[{
+            'name': 'paid_total',
+            'type': 'sum',
+            'sql': '${TABLE}.amount',
+            'description': 'Paid total',
+            'filters': [{'is_paid': 'yes'}, {'status': '-"cancelled"'}],
+            'value_format_name': 'usd',
+        }]))
+
+    def test_short_and_long_lists(self):
+        self.assertDumpsLikeLkml(view(
+            dimension_groups=[{
+                'name': 'created',
+                'type': 'time',
+                'sql': '${TABLE}.created_at',
+                'description': 'Created',
+                'datatype': 'timestamp',
+                'timeframes': ['raw', 'time', 'hour', 'date', 'week', 'month', 'quarter', 'year'],
+            }],
+            measures=[
+                {'name': 'count', 'type': 'count', 'sql': '${TABLE}.id', 'description': 'Count', 'drill_fields': ['a', 'b', 'c', 'd']},
+                {'name': 'max_id', 'type': 'max', 'sql': '${TABLE}.id', 'description': 'Max', 'drill_fields': ['a', 'b', 'c', 'd', 'e']},
+            ],
+        ))
+
+    def test_dump_to_file_object(self):
+        lookml = view(dimensions=[{'name': 'id', 'type': 'number', 'sql': '${TABLE}.id', 'description': 'Id'}])
+        f = io.StringIO()
+        self.assertIsNone(generator.dump_lookml_view(lookml, f))
+        self.assertEqual(f.getvalue(), lkml.dump(lookml))
+
+
+class LookmlMeasuresTest(unittest.TestCase):
+
+    def test_measure_repeated_across_aliases(self):
+        column = models.DbtModelColumn.parse_obj({
+            'name': 'amount',
+            'description': 'Order amount',
+            'meta': {
+                'measures': {'total': {'type': 'sum'}, 'orders': {'type': 'count'}},
+                'metrics': {'total': {'type': 'max', 'description': 'Largest amount'}},
+            },
+        })
+        measures = list(generator.lookml_measures([column], model=None, dimension_names={}))
+        self.assertEqual([m['name'] for m in measures], ['total', 'orders'])
+        self.assertEqual(measures[0]['type'], 'max')
+        self.assertEqual(measures[0]['description'], 'Largest amount')
@@ -0,0 +1,104 @@
+import io
+import json
+import unittest
+
+from dbt2looker import parser
+
+
+def model_node(name: str, materialized: str = 'table', tags=None):
+    return {
+        'unique_id': f'model.project.{name}',
+        'resource_type': 'model',
+        'config': {'materialized': materialized},
+        'relation_name': f'analytics.{name}',
+        'schema': 'analytics',
+        'name': name,
+        'description': f'The {name} model',
+        'columns': {
+            'ID': {'name': 'ID', 'description': 'Id', 'meta': {}},
+            'created_at': {'name': 'created_at', 'description': 'Created', 'meta': {}},
+        },
+        'tags': tags or [],
+        'meta': {},
+        'path': f'marts/{name}.sql',
+    }
+
+
+def catalog_node(name: str):
+    return {
+        'metadata': {'type': 'table', 'schema': 'analytics', 'name': name},
+        'columns': {
+            'ID': {'type': 'NUMBER', 'index': 1, 'name': 'ID'},
+            'CREATED_AT': {'type': 'TIMESTAMP_NTZ', 'index': 2, 'name': 'CREATED_AT'},
+        },
+        'stats': {'has_stats': {'id': 'has_stats', 'value': False, 'include': False}},
+    }
+
+
+RAW_MANIFEST = {
+    'metadata': {'adapter_type': 'snowflake', 'dbt_version': '1.5.0'},
+    'nodes': {
+        'model.project.orders': model_node('orders', tags=['finance']),
+        'model.project.customers': model_node('customers'),
+        'model.project.stg_orders': model_node('stg_orders', materialized='ephemeral'),
+        'test.project.not_null_orders_id': {
+            'unique_id': 'test.project.not_null_orders_id',
+            'resource_type': 'test',
+            'config': {'severity': 'ERROR'},
+        },
+    },
+    'macros': {'macro.project.cents_to_dollars': {'name': 'cents_to_dollars'}},
+}
+
+RAW_CATALOG = {
+    'nodes': {
+        'model.project.orders': catalog_node('orders'),
+        'model.project.customers': catalog_node('customers'),
+    },
+    'sources': {},
+}
+
+
+def json_file(obj: dict):
+    return io.BytesIO(json.dumps(obj).encode())
+
+
+@unittest.skipIf(parser.ijson is None, 'ijson is not installed')
+class StreamManifestTest(unittest.TestCase):
+
+    def test_skips_ephemeral_and_non_model_nodes(self):
+        manifest = parser.stream_manifest(json_file(RAW_MANIFEST))
+        self.assertEqual(set(manifest.nodes), {'model.project.orders', 'model.project.customers'})
+        self.assertEqual(parser.parse_adapter_type(manifest), 'snowflake')
+
+    def test_matches_parse_manifest(self):
+        streamed = parser.parse_typed_models(
+            parser.stream_manifest(json_file(RAW_MANIFEST)),
+            parser.stream_catalog(json_file(RAW_CATALOG)),
+        )
+        parsed = parser.parse_typed_models(
+            parser.parse_manifest(RAW_MANIFEST),
+            parser.parse_catalog(RAW_CATALOG),
+        )
+        self.assertEqual([model.dict() for model in streamed], [model.dict() for model in parsed])
+        self.assertEqual([model.name for model in streamed], ['orders', 'customers'])
+        self.assertEqual(streamed[0].columns['created_at'].data_type, 'TIMESTAMP_NTZ')
+
+    def test_matches_parse_manifest_with_tag(self):
+        streamed = parser.parse_models(parser.stream_manifest(json_file(RAW_MANIFEST)), tag='finance')
+        parsed = parser.parse_models(parser.parse_manifest(RAW_MANIFEST), tag='finance')
+        self.assertEqual([model.dict() for model in streamed], [model.dict() for model in parsed])
+        self.assertEqual([model.name for model in streamed], ['orders'])
+
+    def test_empty_model_fails(self):
+        raw_manifest = dict(RAW_MANIFEST, nodes=dict(RAW_MANIFEST['nodes'], **{
+            'model.project.empty': {
+                'unique_id': 'model.project.empty',
+                'resource_type': 'model',
+                'config': {'materialized': 'view'},
+            },
+        }))
+        for manifest in (parser.stream_manifest(json_file(raw_manifest)), parser.parse_manifest(raw_manifest)):
+            with self.assertLogs(level='ERROR') as logs, self.assertRaises(SystemExit):
+                parser.parse_models(manifest)
+            self.assertIn('is the model file empty?', logs.output[0])